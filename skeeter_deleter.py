@@ -1,20 +1,66 @@
 import argparse
-import dateutil.parser
+import atexit
 import httpx
-import magic
 import os
+import random
+import queue
 import rich.progress
+import threading
 import time
 import json
-from atproto import CAR, Client, models
-from atproto_client.request import Request
+import email.utils
+import mimetypes
+import re
+import signal
+import sys
+from atproto import Client, models
+from atproto_client.request import Request, RequestBase
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, asdict
 from datetime import datetime, timedelta, timezone
-from functools import partial
+from functools import partial, wraps
 from pathlib import Path
+from urllib.parse import urlparse
 import atproto_client.exceptions
 
 RESUME_FILE = "resume_data.json"
+# The resume cursors are also checkpointed every this many pages, in case the process is killed outright
+RESUME_SAVE_INTERVAL = 10
+# Global request budget: ~4800 requests/hour on average, with short bursts allowed
+REQUESTS_PER_HOUR = 4800
+REQUEST_BURST = 10
+# Once the server reports fewer requests than this left in its window, spread the rest until the reset
+RATE_LIMIT_LOW_WATER = 50
+# How often a request answered with 429 or 503 is retried before the response is handed back
+RATE_LIMIT_RETRIES = 5
+# Statuses the safe_* helpers treat as transient and retry. 429 and 503 are left out on purpose:
+# RateLimitedTransport already retries those for every request, and retrying them here too
+# would multiply the attempts
+RETRYABLE_STATUSES = {502, 504}
+BLOB_DOWNLOAD_WORKERS = 8
+# Blobs and the repo export are streamed to disk in chunks of this size instead of being held in memory whole
+BLOB_CHUNK_SIZE = 64 * 1024
+SELF_LIKE_CHECK_WORKERS = 8
+# com.atproto.repo.applyWrites accepts at most 200 writes per call
+APPLY_WRITES_BATCH_SIZE = 200
+# Leading bytes of the media types Bluesky stores as blobs, mapped to a file extension
+BLOB_SIGNATURES = [
+    (b"\xff\xd8\xff", ".jpeg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF8", ".gif"),
+]
+# ISO-BMFF major brands (at byte 8, after "ftyp") of the video files Bluesky accepts. Other brands,
+# such as AVIF/HEIC images, fall through to the Content-Type
+VIDEO_BRANDS = {
+    b"isom": ".mp4", b"iso2": ".mp4", b"iso4": ".mp4", b"iso5": ".mp4", b"iso6": ".mp4",
+    b"mp41": ".mp4", b"mp42": ".mp4", b"avc1": ".mp4", b"dash": ".mp4", b"M4V ": ".mp4",
+    b"qt  ": ".mov",
+}
+# Canonical UTC timestamp as written by Bluesky clients; these sort correctly as plain strings
+UTC_TIMESTAMP_RE = re.compile(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d+)?Z")
+FRACTIONAL_SECONDS_RE = re.compile(r"\.(\d+)")
+# A bare domain name; protected entries of this form are matched by host instead of as substrings
+DOMAIN_NAME_RE = re.compile(r"(?:[a-z0-9-]+\.)+[a-z0-9-]+", re.IGNORECASE)
 
 def load_resume_data():
     """
@@ -22,7 +68,9 @@ def load_resume_data():
       {
         "last_likes_cursor": "...",
         "last_posts_cursor": "...",
-        "last_reposts_cursor": "..."
+        "last_reposts_cursor": "...",
+        "pending_deletes": {"description": "...", "uris": [...]},  (only while deleting)
+        "failed_deletes": [...]   (records the server refused to delete, retried next run)
       }
     If not found or invalid, returns {}.
     """
@@ -38,86 +86,193 @@ def save_resume_data(data: dict):
     """
     Save cursors to resume_data.json, e.g.:
       { "last_likes_cursor": "...", "last_posts_cursor": "...", "last_reposts_cursor": "..." }
+    Written to a temporary file and renamed, so an interrupted save never truncates it.
     """
-    with open(RESUME_FILE, "w", encoding="utf-8") as f:
+    tmp_file = f"{RESUME_FILE}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
         json.dump(data, f, indent=2)
+    os.replace(tmp_file, RESUME_FILE)
 
-class PostQualifier(models.AppBskyFeedDefs.FeedViewPost):
-    def is_viral(self, viral_threshold) -> bool:
-        if viral_threshold == 0:
-            return False
-        return self.post.repost_count >= viral_threshold
+def guess_blob_extension(head: bytes, content_type: str = None) -> str:
+    """
+    Pick a file extension from the blob's leading bytes (only the first chunk is needed).
+    Falls back to the Content-Type the server sent. Returns "" for unknown types.
+    """
+    for signature, ext in BLOB_SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    # WEBP is a RIFF container, identified by its form type at byte 8
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    # MP4 and QuickTime video are ISO-BMFF files: a box size, then "ftyp" and the major brand
+    if head[4:8] == b"ftyp" and head[8:12] in VIDEO_BRANDS:
+        return VIDEO_BRANDS[head[8:12]]
+    if content_type:
+        mime = content_type.split(";")[0].strip().lower()
+        if mime != "application/octet-stream":
+            return mimetypes.guess_extension(mime) or ""
+    return ""
 
-    def is_stale(self, stale_threshold, now) -> bool:
-        if stale_threshold == 0:
-            return False
-        created_at = dateutil.parser.parse(self.post.record.created_at).replace(tzinfo=timezone.utc)
-        return created_at <= now - timedelta(days=stale_threshold)
+def is_protected_link(uri: str, protected_hosts, protected_paths_re) -> bool:
+    """
+    protected_hosts is a frozenset of bare domains; the link's host and each of its parent
+    domains are looked up there. protected_paths_re is one alternation over the remaining
+    entries (paths, schemes, partial names), matched as substrings. Both are built once per run.
+    """
+    if protected_hosts:
+        try:
+            host = urlparse(uri).hostname or ""
+        except ValueError:
+            host = ""
+        while host:
+            if host in protected_hosts:
+                return True
+            host = host.partition(".")[2]
+    return protected_paths_re is not None and protected_paths_re.search(uri) is not None
 
-    def is_protected_domain(self, domains_to_protect) -> bool:
-        return (
-            hasattr(self.post.embed, "external")
-            and any(uri in self.post.embed.external.uri for uri in domains_to_protect)
+def parse_timestamp(value: str) -> datetime:
+    """
+    Parse an atproto ISO-8601 timestamp into an aware datetime with datetime.fromisoformat.
+    Naive timestamps are treated as UTC.
+    """
+    value = value.replace("Z", "+00:00")
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        # Pythons before 3.11 only accept exactly 3 or 6 fractional digits
+        parsed = datetime.fromisoformat(
+            FRACTIONAL_SECONDS_RE.sub(lambda m: "." + m.group(1)[:6].ljust(6, "0"), value, count=1)
         )
-        
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+class Cutoff:
+    """
+    A point in time that record timestamps are compared against, prepared once per run.
+    Canonical UTC timestamps are compared as strings (to the second) without parsing;
+    anything else, or a tie on the second, goes through parse_timestamp.
+    """
+    def __init__(self, when: datetime):
+        self.when = when
+        self.iso_seconds = when.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+
+    def covers(self, timestamp: str) -> bool:
+        """True if `timestamp` is at or before the cutoff."""
+        if UTC_TIMESTAMP_RE.fullmatch(timestamp):
+            head = timestamp[:19]
+            if head != self.iso_seconds:
+                return head < self.iso_seconds
+        return parse_timestamp(timestamp) <= self.when
+
+def retry_after_seconds(headers) -> float:
+    """
+    Seconds to wait according to a Retry-After header (delta-seconds or an HTTP date), or 0.0 if absent.
+    """
+    value = httpx.Headers(headers or {}).get("retry-after")
+    if not value:
+        return 0.0
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def with_retries(max_retries=5, base=1.0, max_backoff=60.0):
+    """
+    Retry the wrapped call on network errors and transient gateway statuses (RETRYABLE_STATUSES),
+    waiting base * 2**attempt with random jitter, capped at max_backoff. If the server sent
+    Retry-After, wait that long plus up to a quarter of the backoff, so threads that were
+    told the same time don't all retry at once. Other errors (bad request, auth, and 429/503
+    that the transport already gave up on) are raised right away.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            for attempt in range(max_retries):
+                try:
+                    return fn(*args, **kwargs)
+                except (atproto_client.exceptions.NetworkError,
+                        atproto_client.exceptions.RequestException,
+                        httpx.RequestError) as e:
+                    response = getattr(e, "response", None)
+                    if response is not None and response.status_code not in RETRYABLE_STATUSES:
+                        raise
+                    if attempt + 1 == max_retries:
+                        break
+                    backoff = min(base * 2 ** attempt, max_backoff)
+                    retry_after = retry_after_seconds(response.headers) if response is not None else 0.0
+                    if retry_after:
+                        delay = retry_after + random.uniform(0, 0.25 * backoff)
+                    else:
+                        delay = backoff * random.uniform(0.5, 1.5)
+                    print(f"{fn.__name__} error on attempt {attempt+1}: {e!r}. Retrying in {delay:.1f}s...")
+                    time.sleep(delay)
+            raise Exception(f"{fn.__name__} failed after {max_retries} attempts.")
+        return wrapper
+    return decorator
+
+@dataclass(slots=True)
+class PostQualifier:
+    """
+    Filter helpers for the PostView of one feed item (FeedViewPost.post).
+    Slotted, since one is built for every post scanned.
+    """
+    client: Client
+    post: models.AppBskyFeedDefs.PostView
+
+    def is_stale(self, stale_cutoff) -> bool:
+        # stale_cutoff is precomputed once per run; None disables the check
+        if stale_cutoff is None:
+            return False
+        return stale_cutoff.covers(self.post.record.created_at)
+
     def is_self_liked(self) -> bool:
+        # Only my own posts count, so anything else needs no lookup at all
+        me_did = self.client.me_did
+        if self.post.author.did != me_did:
+            return False
+        # The author feed already carries my own like of each post in viewer.like
+        if self.post.viewer is not None:
+            return self.post.viewer.like is not None
+        # No viewer state on this item: fall back to asking per post.
         # Possibly slow if many likes. We'll add a small retry for 502.
         lc = None
         while True:
             likes = self.client.safe_get_likes(self.post.uri, lc)  # uses a helper with retry
-            lc = likes.cursor
-            if self.client.me.did in [l.actor.did for l in likes.likes] and self.post.author.did == self.client.me.did:
+            if any(l.actor.did == me_did for l in likes.likes):
                 return True
+            lc = likes.cursor
             if not lc:
-                break
-        return False
-    
-    def __init__(self, client : Client):
-        super(PostQualifier, self).__init__()
-        self._init_PostQualifier(client)
-    
-    def _init_PostQualifier(self, client : Client):
-        self.client = client
-
-    def delete_like(self):
-        self.client.delete_like(self.post.viewer.like)
-
-    def remove(self):
-        # remove => normal post or a repost that belongs to me
-        #   if it's my post => delete_post
-        #   if it's my repost => unrepost
-        if self.post.author.did != self.client.me.did:
-            try:
-                self.client.unrepost(self.post.viewer.repost)
-            except Exception as e:
-                print(f"Failed to unrepost: {self.post} ({e})")
-        else:
-            try:
-                self.client.delete_post(self.post.uri)
-            except Exception as e:
-                print(f"Failed to delete: {self.post.uri} ({e})")
+                return False
 
-    @staticmethod
-    def to_delete(viral_threshold, stale_threshold, domains_to_protect, now, post):
-        if (post.is_viral(viral_threshold) or post.is_stale(stale_threshold, now)) \
-           and not post.is_protected_domain(domains_to_protect) \
-           and not post.is_self_liked():
-            return True
-        return False
+    def removal_uri(self):
+        # URI of the record to delete: my post itself, or my repost record of someone else's post
+        if self.post.author.did != self.client.me_did:
+            return self.post.viewer.repost
+        return self.post.uri
 
     @staticmethod
-    def to_unlike(stale_threshold, now, post):
-        return post.is_stale(stale_threshold, now) and not post.is_self_liked()
-
-    @staticmethod
-    def upgrade_post(client : Client, post : models.AppBskyFeedDefs.FeedViewPost):
+    def may_delete(viral_threshold, stale_cutoff, protected_hosts, protected_paths_re, view):
         """
-        Replaces the old .cast() method to avoid Pydantic collisions.
-        Called to transform a normal feed post object into a PostQualifier instance.
+        The cheap, local part of the delete test, run on the raw PostView so only survivors get
+        wrapped: viral (viral_threshold reposts or more, 0 disables) or stale, and not linking to
+        a protected domain. The model fields are read once, cheapest test first. Candidates still
+        have to pass is_self_liked(), which may need network calls and is checked separately.
         """
-        post.__class__ = PostQualifier
-        post._init_PostQualifier(client)
-        return post
+        if not (viral_threshold and (view.repost_count or 0) >= viral_threshold):
+            if stale_cutoff is None or not stale_cutoff.covers(view.record.created_at):
+                return False
+        external = getattr(view.embed, "external", None)
+        return external is None or not is_protected_link(external.uri, protected_hosts, protected_paths_re)
+
+    @staticmethod
+    def to_unlike(stale_cutoff, post):
+        # Every post in my likes feed is liked by me, so "self-liked" here just means I wrote it
+        return post.post.author.did != post.client.me_did and post.is_stale(stale_cutoff)
 
 @dataclass
 class Credentials:
@@ -127,109 +282,249 @@ class Credentials:
     dict = asdict
 
 
+@dataclass
+class DeleteTarget:
+    """
+    What the destructive step needs from a qualifying post, so the gathered lists
+    don't keep whole feed views (and their embeds) alive until the prompt.
+    uri is the record to delete (post, repost or like); summary is for verbose output.
+    """
+    uri: str
+    summary: str
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Refills at `rate` tokens per second up to `capacity`,
+    so bursts go through immediately while the long-run average stays at `rate`.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._held_until = 0.0
+        self._lock = threading.Lock()
+
+    def hold_until(self, resume_at):
+        """
+        Make every acquire() wait until the monotonic time `resume_at`.
+        """
+        with self._lock:
+            self._held_until = max(self._held_until, resume_at)
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._held_until:
+                    wait = self._held_until - now
+                    # No burst right after a hold: at most one request goes out when it ends
+                    self._updated = self._held_until
+                    self._tokens = min(self._tokens, 1.0)
+                else:
+                    wait = None
+            if wait is not None:
+                time.sleep(wait)
+                continue
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimitedTransport(httpx.HTTPTransport):
+    """
+    HTTP transport that takes a token from a shared TokenBucket before sending each request,
+    follows the server's RateLimit-Remaining/RateLimit-Reset headers and retries 429s and 503s
+    with jittered exponential backoff, or after the server's Retry-After if that is longer.
+    """
+    def __init__(self, bucket: TokenBucket, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bucket = bucket
+        # Protocol of the most recent response (e.g. "HTTP/2"), for verbose output
+        self.http_version = None
+
+    def handle_request(self, request):
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            self.bucket.acquire()
+            response = super().handle_request(request)
+            self.http_version = response.extensions.get("http_version", b"").decode() or None
+            reset_in = self.observe_rate_limit(response.headers)
+            if response.status_code not in (429, 503) or attempt == RATE_LIMIT_RETRIES:
+                return response
+            response.close()
+            wait = max(2 ** attempt * random.uniform(0.5, 1.5), retry_after_seconds(response.headers))
+            if response.status_code == 429:
+                wait = max(wait, reset_in)
+            print(f"Server busy ({response.status_code}), retrying in {wait:.1f}s...")
+            self.bucket.hold_until(time.monotonic() + wait)
+
+    def observe_rate_limit(self, headers) -> float:
+        """
+        Slow every request down once the server's remaining budget runs low, spreading what
+        is left over the time until the window resets. Returns the seconds until reset (0 if unknown).
+        """
+        try:
+            remaining = int(headers["ratelimit-remaining"])
+            reset_in = max(0.0, float(headers["ratelimit-reset"]) - time.time())
+        except (KeyError, ValueError):
+            return 0.0
+        if remaining <= RATE_LIMIT_LOW_WATER and reset_in > 0:
+            self.bucket.hold_until(time.monotonic() + reset_in / max(remaining, 1))
+        return reset_in
+
+
 class RequestCustomTimeout(Request):
     def __init__(self, timeout: httpx.Timeout = httpx.Timeout(120), *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self._client = httpx.Client(follow_redirects=True, timeout=timeout)
-        # Insert a 750 ms delay for every request to avoid rate-limit issues
-        original_request = self._client.request
-        def delayed_request(method, url, *args, **kwargs):
-            time.sleep(0.75)
-            return original_request(method, url, *args, **kwargs)
-        self._client.request = delayed_request
+        # Replace (and close) the default client that Request.__init__ opened
+        self._client.close()
+        # Every request (from any thread) goes through one rate-limited transport to avoid rate-limit issues
+        # All traffic goes to the same PDS host, so multiplex it over a few pooled HTTP/2 connections
+        self.transport = RateLimitedTransport(
+            TokenBucket(REQUESTS_PER_HOUR / 3600, REQUEST_BURST),
+            http2=True,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=30.0)
+        )
+        self._client = httpx.Client(follow_redirects=True, timeout=timeout, transport=self.transport)
+
+    def clone(self):
+        # atproto clones the request for proxied calls; share the pool and the rate limiter instead of opening new ones.
+        # Skip __init__ (ours and Request's), which would build a client only for it to be discarded
+        cloned_request = type(self).__new__(type(self))
+        RequestBase.__init__(cloned_request)
+        cloned_request.set_additional_headers(self.get_headers())
+        cloned_request._client = self._client
+        cloned_request.transport = self.transport
+        return cloned_request
+
+    def stream(self, method, url, **kwargs):
+        """
+        Like get()/post(), but returns httpx's streaming response context manager so the
+        body can be read in chunks. Goes through the same rate-limited transport.
+        """
+        headers = self.get_headers(kwargs.pop('headers', None))
+        return self._client.stream(method, url, headers=headers, **kwargs)
 
 class SafeClient(Client):
     """
     A subclass of atproto.Client that adds:
-    - Automatic retries for certain 5xx or network errors
+    - Automatic retries for network errors and 502/504 (see with_retries)
     """
-    def safe_get_likes(self, uri, cursor=None, max_retries=3):
-        backoff = 1.0
-        for attempt in range(max_retries):
-            try:
-                return self.app.bsky.feed.get_likes(params={
-                    'uri': uri,
-                    'cursor': cursor,
-                    'limit': 100
-                })
-            except (atproto_client.exceptions.NetworkError, httpx.RequestError) as e:
-                print(f"safe_get_likes error on attempt {attempt+1}: {e}. Retrying...")
-                time.sleep(backoff)
-                backoff *= 2
-        raise Exception(f"Failed to fetch likes after {max_retries} attempts.")
-
-    def safe_get_actor_likes(self, actor, cursor=None, max_retries=3):
-        backoff = 1.0
-        for attempt in range(max_retries):
-            try:
-                return self.app.bsky.feed.get_actor_likes(params={
-                    'actor': actor,
-                    'cursor': cursor,
-                    'limit': 100
-                })
-            except (atproto_client.exceptions.NetworkError, httpx.RequestError) as e:
-                print(f"safe_get_actor_likes error on attempt {attempt+1}: {e}. Retrying...")
-                time.sleep(backoff)
-                backoff *= 2
-        raise Exception(f"Failed to fetch actor_likes after {max_retries} attempts.")
-
-    def safe_get_author_feed(self, handle, cursor=None, max_retries=3):
-        backoff = 1.0
-        for attempt in range(max_retries):
-            try:
-                return self.get_author_feed(handle, cursor=cursor, filter="from:me", limit=100)
-            except (atproto_client.exceptions.NetworkError, httpx.RequestError) as e:
-                print(f"safe_get_author_feed error on attempt {attempt+1}: {e}. Retrying...")
-                time.sleep(backoff)
-                backoff *= 2
-        raise Exception(f"Failed to fetch author feed after {max_retries} attempts.")
-
-    def safe_list_records(self, repo, collection, cursor=None, max_retries=3):
-        backoff = 1.0
-        for attempt in range(max_retries):
-            try:
-                resp = self.com.atproto.repo.list_records(params={
-                    'repo': repo,
-                    'collection': collection,
-                    'cursor': cursor,
-                    'limit': 100
-                })
-                return resp
-            except (atproto_client.exceptions.NetworkError, httpx.RequestError) as e:
-                print(f"safe_list_records error on attempt {attempt+1}: {e}. Retrying...")
-                time.sleep(backoff)
-                backoff *= 2
-        raise Exception(f"Failed to list records from {collection} after {max_retries} attempts.")
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.me_did = None
+        self.me_handle = None
+
+    def login(self, *args, **kwargs):
+        # The logged-in identity is checked for nearly every post, so keep plain copies of it
+        profile = super().login(*args, **kwargs)
+        self.me_did = self.me.did
+        self.me_handle = self.me.handle
+        return profile
+
+    @with_retries()
+    def safe_get_likes(self, uri, cursor=None):
+        return self.app.bsky.feed.get_likes(params={
+            'uri': uri,
+            'cursor': cursor,
+            'limit': 100
+        })
+
+    @with_retries()
+    def safe_get_actor_likes(self, actor, cursor=None):
+        return self.app.bsky.feed.get_actor_likes(params={
+            'actor': actor,
+            'cursor': cursor,
+            'limit': 100
+        })
+
+    @with_retries()
+    def safe_get_author_feed(self, handle, cursor=None):
+        return self.get_author_feed(handle, cursor=cursor, filter="from:me", limit=100)
+
+    @with_retries()
+    def safe_list_records(self, repo, collection, cursor=None):
+        return self.com.atproto.repo.list_records(params={
+            'repo': repo,
+            'collection': collection,
+            'cursor': cursor,
+            'limit': 100
+        })
+
+    def apply_deletes(self, uris):
+        """
+        Delete the records behind `uris` (at://did/collection/rkey) in one applyWrites call.
+        """
+        writes = []
+        for uri in uris:
+            _, _, _, collection, rkey = uri.split("/", 4)
+            writes.append(models.ComAtprotoRepoApplyWrites.Delete(collection=collection, rkey=rkey))
+        return self.com.atproto.repo.apply_writes(
+            models.ComAtprotoRepoApplyWrites.Data(repo=self.me_did, writes=writes)
+        )
+
+    def stream_blob(self, did, cid):
+        """
+        Stream a blob from com.atproto.sync.getBlob without buffering the whole body.
+        Use as a context manager; the response is an httpx.Response.
+        """
+        self.refresh_session_if_needed()
+        return self.request.stream("GET", self._build_url("com.atproto.sync.getBlob"), params={'did': did, 'cid': cid})
+
+    def stream_repo(self, did):
+        """
+        Stream the repo export (a CAR file) from com.atproto.sync.getRepo, like stream_blob().
+        """
+        self.refresh_session_if_needed()
+        return self.request.stream("GET", self._build_url("com.atproto.sync.getRepo"), params={'did': did})
+
+    def refresh_session_if_needed(self):
+        """
+        The streaming calls bypass Client._invoke, which is where atproto refreshes an expiring
+        access token; do the same check here so long archive runs don't fail with auth errors.
+        """
+        with self._refresh_lock:
+            if self._access_jwt and self._should_refresh_session():
+                self._refresh_and_set_session()
 
 class SkeeterDeleter:
-    def gather_posts_to_unlike(self, stale_threshold, now, fixed_likes_cursor, pages_per_run, **kwargs):
-        resume = load_resume_data()
-        effective_cursor = fixed_likes_cursor or resume.get("last_likes_cursor")
+    def gather_posts_to_unlike(self, stale_cutoff, fixed_likes_cursor, pages_per_run, **kwargs):
+        """
+        Walk the likes feed (starting at the fixed or resumed cursor) and collect stale likes.
+        Without a stale limit nothing can be unliked, so the scan is skipped.
+        """
+        if stale_cutoff is None:
+            return []
+
+        effective_cursor = fixed_likes_cursor or self.resume_data.get("last_likes_cursor")
         if effective_cursor:
             print(f"Starting from likes cursor: {effective_cursor}")
 
         to_unlike = []
-        page_count = 0
-        while True:
-            if pages_per_run > 0 and page_count >= pages_per_run:
-                print(f"Reached partial run limit of {pages_per_run} pages for likes. Saving and stopping.")
-                break
-
-            posts = self.client.safe_get_actor_likes(
-                actor=self.client.me.handle,
-                cursor=effective_cursor
-            )
-            casted = [PostQualifier.upgrade_post(self.client, p) for p in posts.feed]
-            new_unlikes = [p for p in casted if PostQualifier.to_unlike(stale_threshold, now, p)]
-            to_unlike.extend(new_unlikes)
+        # Like URIs already collected, so the prompt counts each like once
+        seen = set()
+        fetch_page = partial(self.client.safe_get_actor_likes, actor=self.client.me_handle)
+        for posts in self.iter_pages(fetch_page, effective_cursor, pages_per_run, "likes"):
+            for p in posts.feed:
+                pq = PostQualifier(self.client, p.post)
+                if PostQualifier.to_unlike(stale_cutoff, pq) and pq.post.viewer.like and pq.post.viewer.like not in seen:
+                    seen.add(pq.post.viewer.like)
+                    to_unlike.append(DeleteTarget(
+                        pq.post.viewer.like,
+                        f"{pq.post.record.text} by {pq.post.author.handle}, CID: {pq.post.cid}"
+                    ))
 
             if not posts.cursor or posts.cursor == effective_cursor:
                 break
             effective_cursor = posts.cursor
-            page_count += 1
-            existing = load_resume_data()
-            existing["last_likes_cursor"] = effective_cursor
-            save_resume_data(existing)
+            self.resume_data["last_likes_cursor"] = effective_cursor
 
             if self.verbosity > 0:
                 print(f"New likes cursor: {effective_cursor}")
@@ -237,85 +532,81 @@ class SkeeterDeleter:
         self.last_likes_cursor = effective_cursor
         return to_unlike
 
-    def gather_posts_to_delete(self, viral_threshold, stale_threshold, domains_to_protect, now, pages_per_run, **kwargs):
-        resume = load_resume_data()
-        effective_cursor = resume.get("last_posts_cursor")
-        page_count = 0
+    def gather_posts_to_delete(self, viral_threshold, stale_cutoff, protected_hosts, protected_paths_re, pages_per_run, **kwargs):
+        # With both thresholds disabled no post can qualify, so don't walk the feed at all
+        if stale_cutoff is None and not viral_threshold:
+            return []
+
+        effective_cursor = self.resume_data.get("last_posts_cursor")
         to_delete = []
-        while True:
-            if pages_per_run > 0 and page_count >= pages_per_run:
-                print(f"Reached partial run limit of {pages_per_run} pages for posts. Saving and stopping.")
-                break
+        # My own post shows up again where I reposted it, so skip post URIs already seen; this keeps
+        # the prompt's count equal to what gets deleted and saves repeated self-like lookups
+        seen = set()
+        fetch_page = partial(self.client.safe_get_author_feed, handle=self.client.me_handle)
+        delete_test = partial(PostQualifier.may_delete, viral_threshold, stale_cutoff, protected_hosts, protected_paths_re)
+        with ThreadPoolExecutor(max_workers=SELF_LIKE_CHECK_WORKERS) as like_checker:
+            for posts in self.iter_pages(fetch_page, effective_cursor, pages_per_run, "posts"):
+                candidates = []
+                for p in posts.feed:
+                    if p.post.uri not in seen and delete_test(p.post):
+                        seen.add(p.post.uri)
+                        candidates.append(PostQualifier(self.client, p.post))
+                # Most answers come straight from viewer.like; only items without viewer state need
+                # getLikes lookups, so just those run concurrently (still rate limited)
+                lookups = [like_checker.submit(p.is_self_liked) if p.post.viewer is None else None for p in candidates]
+                for p, lookup in zip(candidates, lookups):
+                    liked = lookup.result() if lookup else p.is_self_liked()
+                    uri = p.removal_uri()
+                    if not liked and uri:
+                        to_delete.append(DeleteTarget(
+                            uri,
+                            f"{p.post.record.text} on {p.post.record.created_at}, CID: {p.post.cid}"
+                        ))
 
-            posts = self.client.safe_get_author_feed(
-                handle=self.client.me.handle,
-                cursor=effective_cursor
-            )
-            casted = [PostQualifier.upgrade_post(self.client, p) for p in posts.feed]
-            delete_test = partial(PostQualifier.to_delete, viral_threshold, stale_threshold, domains_to_protect, now)
-            new_deletions = [p for p in casted if delete_test(p)]
-            to_delete.extend(new_deletions)
+                if not posts.cursor or posts.cursor == effective_cursor:
+                    break
+                effective_cursor = posts.cursor
+                self.resume_data["last_posts_cursor"] = effective_cursor
 
-            if not posts.cursor or posts.cursor == effective_cursor:
-                break
-            effective_cursor = posts.cursor
-            page_count += 1
-            existing = load_resume_data()
-            existing["last_posts_cursor"] = effective_cursor
-            save_resume_data(existing)
-
-            if self.verbosity > 0:
-                print(f"New posts cursor: {effective_cursor}")
+                if self.verbosity > 0:
+                    print(f"New posts cursor: {effective_cursor}")
 
         self.last_posts_cursor = effective_cursor
         return to_delete
 
-    def gather_reposts_to_unrepost(self, stale_boost_limit, now, pages_per_run):
+    def gather_reposts_to_unrepost(self, boost_cutoff, pages_per_run):
         """
         For separate handling of older reposts. We'll list from "app.bsky.feed.repost".
         We store progress in "last_reposts_cursor".
-        If stale_boost_limit=0, skip entirely.
+        boost_cutoff is precomputed once per run; if it is None (stale_boost_limit=0), skip entirely.
         """
-        if stale_boost_limit == 0:
+        if boost_cutoff is None:
             return []
 
-        resume = load_resume_data()
-        effective_cursor = resume.get("last_reposts_cursor")
+        effective_cursor = self.resume_data.get("last_reposts_cursor")
         if effective_cursor:
             print(f"Starting from reposts cursor: {effective_cursor}")
 
         reposts_to_unrepost = []
-        page_count = 0
-        while True:
-            if pages_per_run > 0 and page_count >= pages_per_run:
-                print(f"Reached partial run limit of {pages_per_run} pages for reposts. Saving and stopping.")
-                break
-
-            resp = self.client.safe_list_records(
-                repo=self.client.me.handle,
-                collection="app.bsky.feed.repost",
-                cursor=effective_cursor
-            )
+        fetch_page = partial(
+            self.client.safe_list_records,
+            repo=self.client.me_handle,
+            collection="app.bsky.feed.repost"
+        )
+        for resp in self.iter_pages(fetch_page, effective_cursor, pages_per_run, "reposts"):
             if not hasattr(resp, "records"):
                 break
             if len(resp.records) == 0:
                 break
 
             for r in resp.records:
-                created_str = r.value.created_at
-                created_at = dateutil.parser.isoparse(created_str)
-                if created_at <= now - timedelta(days=stale_boost_limit):
+                if boost_cutoff.covers(r.value.created_at):
                     reposts_to_unrepost.append(r.uri)
-                else:
-                    pass
 
             if not resp.cursor or resp.cursor == effective_cursor:
                 break
             effective_cursor = resp.cursor
-            page_count += 1
-            existing = load_resume_data()
-            existing["last_reposts_cursor"] = effective_cursor
-            save_resume_data(existing)
+            self.resume_data["last_reposts_cursor"] = effective_cursor
 
             if self.verbosity > 0:
                 print(f"New reposts cursor: {effective_cursor}")
@@ -323,70 +614,260 @@ class SkeeterDeleter:
         self.last_reposts_cursor = effective_cursor
         return reposts_to_unrepost
 
+    def iter_pages(self, fetch_page, cursor, pages_per_run, kind):
+        """
+        Yield pages from fetch_page(cursor=...) starting at `cursor`. The next page is
+        requested in the background while the caller processes the current one; requests
+        stay strictly sequential. Stops at the end of the feed or after `pages_per_run`
+        pages (0 = no limit). Checkpoints resume_data every RESUME_SAVE_INTERVAL pages.
+        """
+        page_count = 0
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            next_page = prefetcher.submit(fetch_page, cursor=cursor)
+            while True:
+                page = next_page.result()
+                page_count += 1
+                has_more = bool(page.cursor) and page.cursor != cursor
+                within_limit = pages_per_run <= 0 or page_count < pages_per_run
+                if has_more and within_limit:
+                    next_page = prefetcher.submit(fetch_page, cursor=page.cursor)
+                yield page
+                # The caller has stored this page's cursor by now
+                if page_count % RESUME_SAVE_INTERVAL == 0:
+                    save_resume_data(self.resume_data)
+                if not has_more:
+                    return
+                if not within_limit:
+                    print(f"Reached partial run limit of {pages_per_run} pages for {kind}. Saving and stopping.")
+                    return
+                cursor = page.cursor
+
     def batch_unlike_posts(self) -> None:
         if self.verbosity > 0:
             print(f"Unliking {len(self.to_unlike)} post{'' if len(self.to_unlike) == 1 else 's'}")
-        for post in rich.progress.track(self.to_unlike, description="Unliking posts"):
-            if self.verbosity == 2:
-                print(f"Unliking: {post.post.record.post} by {post.post.author.handle}, CID: {post.post.cid}")
-            post.delete_like()
+        if self.verbosity == 2:
+            for target in self.to_unlike:
+                print(f"Unliking: {target.summary}")
+        self.delete_records([target.uri for target in self.to_unlike], "Unliking posts")
 
     def batch_delete_posts(self) -> None:
         if self.verbosity > 0:
             print(f"Deleting {len(self.to_delete)} post{'' if len(self.to_delete) == 1 else 's'}")
-        for post in rich.progress.track(self.to_delete, description="Deleting posts"):
-            if self.verbosity == 2:
-                print(f"Deleting: {post.post.record.post} on {post.post.record.created_at}, CID: {post.post.cid}")
-            post.remove()
+        if self.verbosity == 2:
+            for target in self.to_delete:
+                print(f"Deleting: {target.summary}")
+        self.delete_records([target.uri for target in self.to_delete], "Deleting posts")
+
+    def delete_records(self, uris, description):
+        """
+        Delete records in batches of APPLY_WRITES_BATCH_SIZE, one applyWrites request per batch.
+        Duplicate URIs (e.g. a post seen on two overlapping pages) are dropped first, keeping order;
+        deleting the same record twice in one batch would fail the whole batch.
+        """
+        uris = list(dict.fromkeys(uris))
+        batches = [uris[i:i + APPLY_WRITES_BATCH_SIZE] for i in range(0, len(uris), APPLY_WRITES_BATCH_SIZE)]
+        # Checkpoint what is left after every batch, so a run that dies midway finishes it next time
+        # (see finish_pending_deletes) instead of the URIs being lost behind the saved cursors
+        self.resume_data["pending_deletes"] = {"description": description, "uris": uris}
+        save_resume_data(self.resume_data)
+        failed = []
+        for i, batch in enumerate(rich.progress.track(batches, description=description), 1):
+            try:
+                failed.extend(self.delete_batch(batch))
+            except Exception as e:
+                # Network, auth or rate-limit trouble would fail every later batch too, so stop here;
+                # this batch and the rest stay pending for the next run
+                print(f"{description} stopped, the remaining records are kept for the next run: {e}")
+                raise
+            # Only records that are really gone leave the checkpoint
+            self.resume_data["pending_deletes"]["uris"] = failed + uris[i * APPLY_WRITES_BATCH_SIZE:]
+            save_resume_data(self.resume_data)
+        del self.resume_data["pending_deletes"]
+        if failed:
+            # Kept apart from pending_deletes so the next step of this run doesn't overwrite them
+            print(f"{len(failed)} record{'' if len(failed) == 1 else 's'} could not be deleted and will be retried next run.")
+            self.resume_data["failed_deletes"] = list(dict.fromkeys(self.resume_data.get("failed_deletes", []) + failed))
+        save_resume_data(self.resume_data)
+
+    def delete_batch(self, batch):
+        """
+        Delete one batch with a single applyWrites call. applyWrites is all-or-nothing, so when the
+        server rejects the batch (400, e.g. one record is already gone) each record is retried on
+        its own. Returns the URIs that could not be deleted; any other error is raised to the caller.
+        """
+        try:
+            self.client.apply_deletes(batch)
+            return []
+        except atproto_client.exceptions.BadRequestError as e:
+            print(f"Failed to delete a batch of {len(batch)} record{'' if len(batch) == 1 else 's'}: {e}")
+            if len(batch) == 1:
+                return batch
+        failed = []
+        for uri in batch:
+            try:
+                self.client.apply_deletes([uri])
+            except atproto_client.exceptions.BadRequestError as e:
+                print(f"Failed to delete: {uri} => {e}")
+                failed.append(uri)
+        return failed
+
+    def finish_pending_deletes(self):
+        """
+        Resume the delete_records() call an interrupted run left unfinished, then retry the records
+        earlier runs failed to delete. Those records were already gathered, archived and confirmed,
+        and the saved cursors are past them.
+        """
+        pending = self.resume_data.get("pending_deletes")
+        if pending:
+            n_pending = len(pending["uris"])
+            print(f"Resuming {n_pending} deletion{'' if n_pending == 1 else 's'} left from an interrupted run.")
+            self.delete_records(pending["uris"], pending["description"])
+        failed = self.resume_data.pop("failed_deletes", None)
+        if failed:
+            print(f"Retrying {len(failed)} deletion{'' if len(failed) == 1 else 's'} that failed in an earlier run.")
+            self.delete_records(failed, "Retrying failed deletions")
 
     def batch_unrepost(self, repost_uris):
         if self.verbosity > 0:
             print(f"Undoing {len(repost_uris)} older repost{'' if len(repost_uris) == 1 else 's'}")
-        for uri in rich.progress.track(repost_uris, description="Unreposting"):
-            try:
-                self.client.unrepost(uri)
-            except Exception as e:
-                print(f"Failed to unrepost: {uri} => {e}")
-            
+        self.delete_records(repost_uris, "Unreposting")
+
     def archive_repo(self, now, **kwargs):
-        repo = self.client.com.atproto.sync.get_repo(params={'did': self.client.me.did})
-        car = CAR.from_bytes(repo)
-        clean_user_did = self.client.me.did.replace(":", "_")
+        clean_user_did = self.client.me_did.replace(":", "_")
         Path(f"archive/{clean_user_did}/_blob/").mkdir(parents=True, exist_ok=True)
         print("Archiving posts...")
         clean_now = now.isoformat().replace(':','_')
-        with open(f"archive/{clean_user_did}/bsky-archive-{clean_now}.car", "wb") as f:
-            f.write(repo)
+        car_path = f"archive/{clean_user_did}/bsky-archive-{clean_now}.car"
+        # The repo export doesn't depend on the blobs, so download it while they are listed and fetched
+        with ThreadPoolExecutor(max_workers=1) as repo_downloader:
+            repo_download = repo_downloader.submit(self.download_repo, car_path)
+            self.archive_blobs(clean_user_did)
+            repo_download.result()
 
-        cursor = None
+    def download_repo(self, car_path):
+        """
+        Stream the repo CAR to disk, so it is never held in memory whole.
+        """
+        part_path = f"{car_path}.part"
+        try:
+            with self.client.stream_repo(self.client.me_did) as response:
+                response.raise_for_status()
+                with open(part_path, "wb") as f:
+                    for chunk in response.iter_bytes(BLOB_CHUNK_SIZE):
+                        f.write(chunk)
+            os.replace(part_path, car_path)
+        finally:
+            # A failed or interrupted export leaves nothing behind; the next run starts a fresh one
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+    def archive_blobs(self, clean_user_did):
         print("Downloading and archiving media...")
-        blob_cids = []
+        # Blobs are content-addressed, so anything already archived by an earlier run can be skipped.
+        # Index the blob folder once instead of probing the filesystem per CID.
+        blob_dir = f"archive/{clean_user_did}/_blob"
+        blob_prefix = os.path.join(blob_dir, "")
+        archived = {
+            entry.name.split(".")[0]
+            for entry in os.scandir(blob_dir)
+            if entry.is_file() and not entry.name.endswith(".part")
+        }
+
+        # Each worker streams its own blob to disk, so disk writes overlap with other fetches
+        # instead of queueing up behind the main thread; the queue only reports completions
+        finished = queue.Queue()
+        # Only a couple of CIDs per worker are queued at a time, so a large repo doesn't pile up
+        # as pending futures and an interrupted run has little left to cancel
+        in_flight = threading.Semaphore(2 * BLOB_DOWNLOAD_WORKERS)
+        def archive_blob(cid):
+            try:
+                self.download_blob(blob_prefix, cid)
+            except Exception as e:
+                print(f"Error fetching blob {cid}: {e}")
+            finally:
+                in_flight.release()
+                finished.put(cid)
+
+        # Downloads start as soon as the first list_blobs page arrives and run concurrently
+        # (still paced by the shared rate limiter), interleaved with listing the remaining pages
+        submitted = done = skipped = 0
+        executor = ThreadPoolExecutor(max_workers=BLOB_DOWNLOAD_WORKERS)
+        try:
+            with rich.progress.Progress() as progress:
+                task = progress.add_task("Downloading blobs", total=None)
+
+                def track_finished(block):
+                    nonlocal done
+                    while done < submitted:
+                        try:
+                            finished.get(block=block)
+                        except queue.Empty:
+                            return
+                        done += 1
+                        progress.advance(task)
+
+                for cid in self.iter_blob_cids():
+                    if cid in archived:
+                        skipped += 1
+                        continue
+                    in_flight.acquire()
+                    executor.submit(archive_blob, cid)
+                    submitted += 1
+                    progress.update(task, total=submitted)
+                    track_finished(block=False)
+                track_finished(block=True)
+        except BaseException:
+            # Ctrl-C or SIGTERM: drop the queued downloads instead of waiting for every one of them
+            executor.shutdown(cancel_futures=True)
+            raise
+        executor.shutdown()
+
+        if self.verbosity > 0 and skipped:
+            print(f"Skipped {skipped} blob{'' if skipped == 1 else 's'} already archived")
+
+    def iter_blob_cids(self):
+        """
+        Yield the CIDs of every blob in my repo, fetching list_blobs pages as they are consumed.
+        """
+        cursor = None
         while True:
             try:
-                blob_page = self.client.com.atproto.sync.list_blobs(params={'did': self.client.me.did, 'cursor': cursor})
+                blob_page = self.client.com.atproto.sync.list_blobs(params={'did': self.client.me_did, 'cursor': cursor})
             except Exception as e:
                 print(f"Error listing blobs: {e}")
-                break
-            blob_cids.extend(blob_page.cids)
+                return
+            yield from blob_page.cids
             cursor = blob_page.cursor
             if not cursor:
-                break
-        for cid in rich.progress.track(blob_cids, description="Downloading blobs"):
-            try:
-                blob = self.client.com.atproto.sync.get_blob(params={'cid': cid, 'did': self.client.me.did})
-            except Exception as e:
-                print(f"Error fetching blob {cid}: {e}")
-                continue
-            file_type = magic.from_buffer(blob, 2048)
-            ext = ".jpeg" if file_type == "image/jpeg" else ""
-            file_path = f"archive/{clean_user_did}/_blob/{cid}{ext}"
+                return
+
+    def download_blob(self, blob_prefix, cid):
+        """
+        Stream one blob to disk chunk by chunk. The extension is picked from the first chunk.
+        blob_prefix is the blob folder with its trailing separator, joined once per run.
+        """
+        with self.client.stream_blob(self.client.me_did, cid) as response:
+            response.raise_for_status()
+            chunks = response.iter_bytes(BLOB_CHUNK_SIZE)
+            head = next(chunks, b"")
+            ext = guess_blob_extension(head, response.headers.get("content-type"))
+            file_path = f"{blob_prefix}{cid}{ext}"
+            part_path = f"{file_path}.part"
             try:
-                with open(file_path, "wb") as f:
+                # Write to a temporary name first so an interrupted run never leaves a truncated blob that looks archived
+                with open(part_path, "wb") as f:
                     if self.verbosity == 2:
                         print(f"Saving blob {cid}{ext}")
-                    f.write(blob)
-            except Exception as ee:
+                    f.write(head)
+                    for chunk in chunks:
+                        f.write(chunk)
+                os.replace(part_path, file_path)
+            except OSError as ee:
                 print(f"Error writing blob {cid}{ext} => {ee}")
+            finally:
+                # Whatever stopped the write (disk error, connection dropped mid-body, Ctrl-C), drop the partial file
+                if os.path.exists(part_path):
+                    os.remove(part_path)
 
     def __init__(
         self,
@@ -408,14 +889,28 @@ class SkeeterDeleter:
 
         self.verbosity = verbosity
         self.autodelete = autodelete
+        if self.verbosity > 0:
+            print(f"Connected to the PDS over {self.client.request.transport.http_version}")
+
+        # Cursors live in memory while gathering and are written when the process exits
+        # (normally, on an exception, Ctrl-C or SIGTERM), plus a checkpoint every few pages
+        self.resume_data = load_resume_data()
+        atexit.register(save_resume_data, self.resume_data)
+
+        # 0) Finish deletions that an interrupted run had already confirmed
+        self.finish_pending_deletes()
+
+        protected_hosts = frozenset(d.lower() for d in domains_to_protect if DOMAIN_NAME_RE.fullmatch(d))
+        protected_paths = [d for d in domains_to_protect if d.lower() not in protected_hosts]
 
         now = datetime.now(timezone.utc)
         params = {
             'viral_threshold': viral_threshold,
-            'stale_threshold': stale_threshold,
-            'domains_to_protect': domains_to_protect,
+            'protected_hosts': protected_hosts,
+            'protected_paths_re': re.compile("|".join(map(re.escape, protected_paths))) if protected_paths else None,
             'fixed_likes_cursor': fixed_likes_cursor,
             'now': now,
+            'stale_cutoff': Cutoff(now - timedelta(days=stale_threshold)) if stale_threshold else None,
             'pages_per_run': pages_per_run
         }
 
@@ -431,7 +926,8 @@ class SkeeterDeleter:
         print(f"Found {len(self.to_delete)} post{'' if len(self.to_delete) == 1 else 's'} to delete.")
 
         # 4) Gather older reposts if stale_boost_limit > 0
-        self.reposts_to_unrepost = self.gather_reposts_to_unrepost(stale_boost_limit, now, pages_per_run)
+        boost_cutoff = Cutoff(now - timedelta(days=stale_boost_limit)) if stale_boost_limit else None
+        self.reposts_to_unrepost = self.gather_reposts_to_unrepost(boost_cutoff, pages_per_run)
         if stale_boost_limit > 0:
             print(f"Found {len(self.reposts_to_unrepost)} older repost{'' if len(self.reposts_to_unrepost) == 1 else 's'} to undo.")
 
@@ -502,6 +998,9 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
 
+    # Turn SIGTERM into a normal exit so the resume cursors are still saved
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+
     domains_list = [s.strip() for s in args.domains_to_protect.split(",") if s.strip()]
     verbosity_level = 0
     if args.verbose: